@@ -10,21 +10,13 @@ Geo Photo Tagger - скрипт для автоматического геоте
 """
 
 import sys
-import os
 import logging
 from src import Config, PhotoProcessor, GoogleSheetsClient
 
 def main():
     # Настройка логирования
     Config.ensure_directories()
-    logging.basicConfig(
-        level=Config.LOG_LEVEL,
-        format=Config.LOG_FORMAT,
-        handlers=[
-            logging.FileHandler(os.path.join(Config.LOG_DIR, 'main.log')),
-            logging.StreamHandler()  # Вывод в консоль
-        ]
-    )
+    Config.setup_logging()
     
     logger = logging.getLogger(__name__)
     logger.info("✓ Проверка окружения успешно завершена")
@@ -1,19 +1,11 @@
 import logging
-import os
 import sys
 from src import Config, PhotoProcessor, GoogleSheetsClient
 
 def main():
     # Настройка логирования
     Config.ensure_directories()
-    logging.basicConfig(
-        level=Config.LOG_LEVEL,
-        format=Config.LOG_FORMAT,
-        handlers=[
-            logging.FileHandler(os.path.join(Config.LOG_DIR, 'main.log')),
-            logging.StreamHandler()  # Вывод в консоль
-        ]
-    )
+    Config.setup_logging()
     
     logger = logging.getLogger(__name__)
     logger.info("✓ Проверка окружения успешно завершена")
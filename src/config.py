@@ -1,9 +1,13 @@
 import os
+import logging.config
 from dotenv import load_dotenv
 
 # Загрузка переменных окружения
 load_dotenv()
 
+# Директории уже созданы в этом процессе
+_DIRS_READY = False
+
 class Config:
     # Google Sheets настройки
     GOOGLE_SHEETS_CREDENTIALS = os.getenv('GOOGLE_SHEETS_CREDENTIALS', 'credentials.json')
@@ -24,7 +28,7 @@ class Config:
     
     # Настройки обработки фото
     SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.JPG', '.JPEG']
-    CREATE_BACKUP = os.getenv('CREATE_BACKUP', 'True').lower() == 'true'
+    CREATE_BACKUP = os.getenv('CREATE_BACKUP', 'False').lower() == 'true'
     
     # Настройки многопоточности
     MAX_WORKERS = int(os.getenv('MAX_WORKERS', '4'))
@@ -32,5 +36,53 @@ class Config:
     @classmethod
     def ensure_directories(cls):
         """Создание необходимых директорий"""
+        global _DIRS_READY
+        if _DIRS_READY:
+            return
         os.makedirs(cls.LOG_DIR, exist_ok=True)
-        os.makedirs(cls.CACHE_DIR, exist_ok=True) 
\ No newline at end of file
+        os.makedirs(cls.CACHE_DIR, exist_ok=True)
+        _DIRS_READY = True
+        
+    @classmethod
+    def setup_logging(cls):
+        """Настройка логирования для всей программы.
+        
+        Общие main.log и консоль на корневом логгере, плюс отдельный файл
+        для каждого модуля пакета (сообщения модулей попадают и в общие).
+        """
+        cls.ensure_directories()
+        module_logs = {
+            'src.photo_processor': 'photo_processor.log',
+            'src.google_sheets': 'google_sheets.log',
+            'src.geo_utils': 'geo_utils.log',
+        }
+        handlers = {
+            'main': {
+                'class': 'logging.FileHandler',
+                'filename': os.path.join(cls.LOG_DIR, 'main.log'),
+                'formatter': 'default',
+                'encoding': 'utf-8',
+            },
+            'console': {
+                'class': 'logging.StreamHandler',
+                'formatter': 'default',
+            },
+        }
+        loggers = {}
+        for name, filename in module_logs.items():
+            handlers[name] = {
+                'class': 'logging.FileHandler',
+                'filename': os.path.join(cls.LOG_DIR, filename),
+                'formatter': 'default',
+                'encoding': 'utf-8',
+            }
+            loggers[name] = {'level': cls.LOG_LEVEL, 'handlers': [name]}
+            
+        logging.config.dictConfig({
+            'version': 1,
+            'disable_existing_loggers': False,
+            'formatters': {'default': {'format': cls.LOG_FORMAT}},
+            'handlers': handlers,
+            'loggers': loggers,
+            'root': {'level': cls.LOG_LEVEL, 'handlers': ['main', 'console']},
+        })
@@ -1,93 +1,220 @@
 import os
-import json
+import atexit
 import logging
-from typing import Dict, Optional, Tuple
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+import sqlite3
+import threading
 import time
+import functools
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import orjson
+from geopy.geocoders import Nominatim
+from geopy.adapters import RequestsAdapter
+from geopy.extra.rate_limiter import RateLimiter
 
 from .config import Config
 
+logger = logging.getLogger(__name__)
+
+# Минимальный интервал между запросами к Nominatim (политика: 1 запрос/с).
+# Соблюдается для всего процесса, а не для отдельного экземпляра GeoUtils.
+_REVERSE_MIN_INTERVAL = 1.0
+_reverse_gate = threading.Lock()
+_last_reverse_call = 0.0
+
+def _gated_call(func, *args, **kwargs):
+    """Вызов func не чаще одного раза в _REVERSE_MIN_INTERVAL секунд"""
+    global _last_reverse_call
+    with _reverse_gate:
+        wait = _REVERSE_MIN_INTERVAL - (time.monotonic() - _last_reverse_call)
+        if wait > 0:
+            time.sleep(wait)
+        _last_reverse_call = time.monotonic()
+    return func(*args, **kwargs)
+
+def _dms_kernel(decimal):
+    """Числовое ядро перевода градусов в (градусы, минуты, сотые доли секунд)"""
+    degrees = int(decimal)
+    minutes = int((decimal - degrees) * 60)
+    seconds = ((decimal - degrees) * 60 - minutes) * 60
+    return degrees, minutes, int(seconds * 100)
+
+# Ядро, скомпилированное numba; собирается при первой поштучной конвертации
+_decimal_to_dms = None
+
+def _get_dms_kernel():
+    """Ядро перевода в DMS: numba импортируется лениво и необязателен.
+    
+    Основной поток координат идет через convert_coordinates_batch, поэтому
+    импорт numba (~0.2 с) не должен стоить ничего ни родителю, ни воркерам пула.
+    """
+    global _decimal_to_dms
+    if _decimal_to_dms is None:
+        try:
+            from numba import njit
+        except ImportError:  # без numba ядро работает как обычная функция
+            _decimal_to_dms = _dms_kernel
+        else:
+            _decimal_to_dms = njit(cache=True)(_dms_kernel)
+    return _decimal_to_dms
+
 class GeoUtils:
+    # Множитель для квантования координат в ключ кэша (~1 м)
+    CACHE_PRECISION = 10 ** 5
+    # Результат пакетной конвертации: ссылки N/S, E/W и рациональные DMS (3, 2)
+    GPS_BATCH_DTYPE = np.dtype([
+        ('lat_ref', 'U1'),
+        ('lat_dms', np.int64, (3, 2)),
+        ('lon_ref', 'U1'),
+        ('lon_dms', np.int64, (3, 2)),
+    ])
+
     def __init__(self):
         self.config = Config()
-        self._setup_logging()
-        self.geocoder = Nominatim(user_agent=Config.NOMINATIM_USER_AGENT)
+        # Один RequestsAdapter держит keep-alive сессию на все запросы;
+        # хост один, поэтому достаточно одного пула на несколько соединений
+        self.geocoder = Nominatim(
+            user_agent=Config.NOMINATIM_USER_AGENT,
+            timeout=15,
+            adapter_factory=functools.partial(RequestsAdapter, pool_connections=1, pool_maxsize=4)
+        )
+        # Интервал между запросами (включая повторы) выдерживает _gated_call,
+        # RateLimiter отвечает только за повторные попытки
+        self._reverse = RateLimiter(
+            functools.partial(_gated_call, self.geocoder.reverse),
+            min_delay_seconds=0,
+            max_retries=max(Config.MAX_RETRIES - 1, 0),
+            error_wait_seconds=Config.RETRY_DELAY,
+            swallow_exceptions=False
+        )
         self._load_cache()
-        
-    def _setup_logging(self):
-        """Настройка логирования"""
-        self.logger = logging.getLogger(__name__)
-        handler = logging.FileHandler(os.path.join(Config.LOG_DIR, 'geo_utils.log'))
-        handler.setFormatter(logging.Formatter(Config.LOG_FORMAT))
-        self.logger.addHandler(handler)
-        self.logger.setLevel(Config.LOG_LEVEL)
+        atexit.register(self._close_cache)
         
     def _load_cache(self):
-        """Загрузка кэша геоданных"""
-        self.cache_file = os.path.join(Config.CACHE_DIR, 'geo_cache.json')
+        """Открытие кэша геоданных (SQLite в режиме WAL)"""
+        # Без директории кэша SQLite не откроет файл; повторные вызовы ничего не стоят
+        Config.ensure_directories()
+        self.cache_file = os.path.join(Config.CACHE_DIR, 'geo_cache.db')
+        self._cache_lock = threading.Lock()
+        self.cache = sqlite3.connect(self.cache_file, check_same_thread=False)
+        self.cache.execute('PRAGMA journal_mode=WAL')
+        self.cache.execute('PRAGMA synchronous=NORMAL')
+        self.cache.execute(
+            'CREATE TABLE IF NOT EXISTS geo ('
+            'lat_q INTEGER, lon_q INTEGER, payload BLOB, '
+            'PRIMARY KEY (lat_q, lon_q))'
+        )
+        self.cache.commit()
+        self._import_legacy_cache()
+        
+    def _import_legacy_cache(self):
+        """Перенос записей из прежнего кэша geo_cache.json, пока таблица пуста"""
+        legacy_file = os.path.join(Config.CACHE_DIR, 'geo_cache.json')
+        if not os.path.exists(legacy_file):
+            return
+        if self.cache.execute('SELECT 1 FROM geo LIMIT 1').fetchone():
+            return
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self.cache = json.load(f)
-            else:
-                self.cache = {}
-        except Exception as e:
-            self.logger.error(f"Ошибка при загрузке кэша: {str(e)}")
-            self.cache = {}
+            with open(legacy_file, 'rb') as f:
+                legacy = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.error(f"Ошибка при загрузке прежнего кэша {legacy_file}: {str(e)}")
+            return
             
-    def _save_cache(self):
-        """Сохранение кэша геоданных"""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            self.logger.error(f"Ошибка при сохранении кэша: {str(e)}")
+        # Ключи прежнего кэша - строки "lat,lon" без квантования
+        rows = []
+        for key, payload in legacy.items():
+            try:
+                lat, lon = map(float, key.split(','))
+            except ValueError:
+                logger.warning(f"Пропущен некорректный ключ прежнего кэша: {key}")
+                continue
+            rows.append((*self._cache_key(lat, lon), orjson.dumps(payload)))
+            
+        with self.cache:
+            self.cache.executemany(
+                'INSERT OR IGNORE INTO geo (lat_q, lon_q, payload) VALUES (?, ?, ?)', rows
+            )
+        logger.info(f"Из {legacy_file} перенесено записей кэша: {len(rows)}")
+        
+    def _close_cache(self):
+        """Закрытие кэша геоданных"""
+        with self._cache_lock:
+            self.cache.close()
             
+    @classmethod
+    def _cache_key(cls, lat: float, lon: float) -> Tuple[int, int]:
+        """Квантование координат (~1 м), чтобы шум в младших разрядах не давал промахов кэша"""
+        return int(round(lat * cls.CACHE_PRECISION)), int(round(lon * cls.CACHE_PRECISION))
+        
     def get_location_info(self, lat: float, lon: float) -> Optional[Dict]:
         """Получение информации о местоположении по координатам"""
-        cache_key = f"{lat},{lon}"
+        cache_key = self._cache_key(lat, lon)
         
         # Проверяем кэш
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        try:
+            with self._cache_lock:
+                row = self.cache.execute(
+                    'SELECT payload FROM geo WHERE lat_q = ? AND lon_q = ?', cache_key
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при чтении кэша: {str(e)}")
+            row = None
+        if row:
+            return orjson.loads(row[0])
             
-        # Делаем запрос к геокодеру с повторными попытками
-        for attempt in range(Config.MAX_RETRIES):
-            try:
-                location = self.geocoder.reverse((lat, lon))
-                if location:
-                    result = {
-                        'address': location.address,
-                        'raw': location.raw,
-                        'city': location.raw.get('address', {}).get('city'),
-                        'country': location.raw.get('address', {}).get('country'),
-                        'postcode': location.raw.get('address', {}).get('postcode'),
-                    }
-                    
-                    # Сохраняем в кэш
-                    self.cache[cache_key] = result
-                    self._save_cache()
-                    
-                    return result
-                    
-            except GeocoderTimedOut:
-                if attempt < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                continue
-            except Exception as e:
-                self.logger.error(f"Ошибка при получении геоданных для {lat},{lon}: {str(e)}")
-                break
-                
-        return None
+        # Делаем запрос к геокодеру (повторы и паузы выполняет RateLimiter)
+        try:
+            location = self._reverse((lat, lon))
+        except Exception as e:
+            logger.error(f"Ошибка при получении геоданных для {lat},{lon}: {str(e)}")
+            return None
+            
+        if not location:
+            return None
+            
+        result = {
+            'address': location.address,
+            'raw': location.raw,
+            'city': location.raw.get('address', {}).get('city'),
+            'country': location.raw.get('address', {}).get('country'),
+            'postcode': location.raw.get('address', {}).get('postcode'),
+        }
+        
+        # Сохраняем в кэш и сразу фиксируем: в режиме WAL с synchronous=NORMAL это дешево,
+        # а открытая транзакция держала бы блокировку записи для других подключений
+        try:
+            with self._cache_lock, self.cache:
+                self.cache.execute(
+                    'INSERT OR IGNORE INTO geo (lat_q, lon_q, payload) VALUES (?, ?, ?)',
+                    (*cache_key, orjson.dumps(result))
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при сохранении кэша: {str(e)}")
+            
+        return result
+        
+    def get_location_info_batch(self, points: Iterable[Tuple[float, float]]) -> Dict[Tuple[float, float], Optional[Dict]]:
+        """Получение информации о местоположении для набора координат.
+        
+        Координаты, совпадающие после квантования (как в ключе кэша),
+        запрашиваются один раз. Ключи результата - квантованные координаты.
+        """
+        results = {}
+        for lat, lon in points:
+            lat_q, lon_q = self._cache_key(lat, lon)
+            key = (lat_q / self.CACHE_PRECISION, lon_q / self.CACHE_PRECISION)
+            if key not in results:
+                results[key] = self.get_location_info(*key)
+        return results
         
     def convert_coordinates(self, lat: float, lon: float) -> Tuple[Dict, Dict]:
         """Конвертация координат в формат для EXIF"""
+        kernel = _get_dms_kernel()
+        
         def decimal_to_dms(decimal):
-            degrees = int(decimal)
-            minutes = int((decimal - degrees) * 60)
-            seconds = ((decimal - degrees) * 60 - minutes) * 60
-            return (degrees, 1), (minutes, 1), (int(seconds * 100), 100)
+            degrees, minutes, seconds = kernel(decimal)
+            return (degrees, 1), (minutes, 1), (seconds, 100)
             
         lat_ref = 'N' if lat >= 0 else 'S'
         lon_ref = 'E' if lon >= 0 else 'W'
@@ -105,4 +232,35 @@ class GeoUtils:
             'longitude': abs(lon),
             'latitude_ref': lat_ref,
             'longitude_ref': lon_ref
-        } 
\ No newline at end of file
+        }
+        
+    @staticmethod
+    def _decimal_to_dms_batch(decimal: np.ndarray) -> np.ndarray:
+        """Векторная версия decimal_to_dms для неотрицательных значений"""
+        degrees = np.trunc(decimal)
+        minutes_float = (decimal - degrees) * 60
+        minutes = np.trunc(minutes_float)
+        seconds = (minutes_float - minutes) * 60
+        
+        dms = np.empty((decimal.shape[0], 3, 2), dtype=np.int64)
+        dms[:, 0, 0] = degrees
+        dms[:, 1, 0] = minutes
+        dms[:, 2, 0] = np.trunc(seconds * 100)
+        dms[:, :2, 1] = 1
+        dms[:, 2, 1] = 100
+        return dms
+        
+    def convert_coordinates_batch(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Пакетная конвертация координат в формат для EXIF.
+        
+        Результат совпадает с convert_coordinates для каждой пары координат.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        
+        result = np.empty(lats.shape[0], dtype=self.GPS_BATCH_DTYPE)
+        result['lat_ref'] = np.where(lats >= 0, 'N', 'S')
+        result['lon_ref'] = np.where(lons >= 0, 'E', 'W')
+        result['lat_dms'] = self._decimal_to_dms_batch(np.abs(lats))
+        result['lon_dms'] = self._decimal_to_dms_batch(np.abs(lons))
+        return result
@@ -1,6 +1,6 @@
-import os
 import logging
-from typing import List, Dict
+import functools
+from typing import List, Dict, Tuple
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -9,76 +9,81 @@ from google.oauth2 import service_account
 
 from .config import Config
 
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=1)
+def _build_sheets_service(credentials_file: str, scopes: Tuple[str, ...]):
+    """Создание сервиса Google Sheets (один раз на процесс)"""
+    credentials = service_account.Credentials.from_service_account_file(
+        credentials_file,
+        scopes=list(scopes)
+    )
+    # Встроенный discovery-документ: без сетевого запроса и файлового кэша
+    return build('sheets', 'v4', credentials=credentials,
+                 static_discovery=True, cache_discovery=False)
+
 class GoogleSheetsClient:
     # Области доступа для Google Sheets API
     SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+    # Столбцы, без которых строка пропускается
+    REQUIRED_FIELDS = ['Путь', 'Широта', 'Долгота']
     
     def __init__(self):
         self.config = Config()
-        self._setup_logging()
         self.service = self._get_sheets_service()
         
-    def _setup_logging(self):
-        """Настройка логирования"""
-        self.logger = logging.getLogger(__name__)
-        handler = logging.FileHandler(os.path.join(Config.LOG_DIR, 'google_sheets.log'))
-        handler.setFormatter(logging.Formatter(Config.LOG_FORMAT))
-        self.logger.addHandler(handler)
-        self.logger.setLevel(Config.LOG_LEVEL)
-        
     def _get_sheets_service(self):
         """Получение сервиса для работы с Google Sheets"""
         try:
-            credentials = service_account.Credentials.from_service_account_file(
-                Config.GOOGLE_SHEETS_CREDENTIALS,
-                scopes=self.SCOPES
-            )
-            return build('sheets', 'v4', credentials=credentials)
+            return _build_sheets_service(Config.GOOGLE_SHEETS_CREDENTIALS, tuple(self.SCOPES))
         except Exception as e:
-            self.logger.error(f"Ошибка при инициализации Google Sheets API: {str(e)}")
+            logger.error(f"Ошибка при инициализации Google Sheets API: {str(e)}")
             raise
             
     def get_photos_data(self) -> List[Dict]:
         """Получение данных о фотографиях из таблицы"""
         try:
-            result = self.service.spreadsheets().values().get(
+            # Заголовки и данные получаем одним запросом
+            result = self.service.spreadsheets().values().batchGet(
                 spreadsheetId=Config.SPREADSHEET_ID,
-                range='A2:Z'  # Начинаем со второй строки, предполагая что первая - заголовки
+                ranges=['A1:Z1', 'A2:Z'],  # Первая строка - заголовки, далее данные
+                fields='valueRanges(values)'  # Без метаданных диапазонов в ответе
             ).execute()
             
-            values = result.get('values', [])
+            headers_range, values_range = result.get('valueRanges', [{}, {}])
+            
+            values = values_range.get('values', [])
             if not values:
-                self.logger.warning("Данные в таблице не найдены")
+                logger.warning("Данные в таблице не найдены")
                 return []
                 
-            # Получаем заголовки
-            headers_result = self.service.spreadsheets().values().get(
-                spreadsheetId=Config.SPREADSHEET_ID,
-                range='A1:Z1'
-            ).execute()
+            headers = headers_range.get('values', [[]])[0]
             
-            headers = headers_result.get('values', [[]])[0]
+            # Индексы обязательных столбцов определяем один раз
+            # (при повторяющихся заголовках, как и в dict(zip(...)), берется последний)
+            header_index = {header: i for i, header in enumerate(headers)}
+            required_columns = [(field, header_index.get(field)) for field in self.REQUIRED_FIELDS]
             
             # Преобразуем данные в список словарей
             photos_data = []
             for row in values:
-                # Дополняем строку пустыми значениями, если она короче заголовков
-                row_extended = row + [''] * (len(headers) - len(row))
-                photo_data = dict(zip(headers, row_extended))
-                
-                # Проверяем обязательные поля
-                required_fields = ['Путь', 'Широта', 'Долгота']
-                missing_fields = [field for field in required_fields if field not in photo_data or not photo_data[field]]
+                # Проверяем обязательные поля до построения словаря
+                missing_fields = [
+                    field for field, index in required_columns
+                    if index is None or index >= len(row) or not row[index]
+                ]
                 
                 if missing_fields:
-                    self.logger.warning(f"Пропущена строка с отсутствующими полями {', '.join(missing_fields)}: {photo_data}")
+                    logger.warning(f"Пропущена строка с отсутствующими полями {', '.join(missing_fields)}: {row}")
                     continue
                     
-                photos_data.append(photo_data)
+                # Дополняем строку пустыми значениями, если она короче заголовков
+                row_extended = row + [''] * (len(headers) - len(row))
+                photos_data.append(dict(zip(headers, row_extended)))
                 
-            self.logger.info(f"Получено {len(photos_data)} записей из таблицы")
+            logger.info(f"Получено {len(photos_data)} записей из таблицы")
             return photos_data
             
         except Exception as e:
-            self.logger.error(f"Ошибка при получении данных из таблицы: {str(e)}")
+            logger.error(f"Ошибка при получении данных из таблицы: {str(e)}")
             return [] 
\ No newline at end of file
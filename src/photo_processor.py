@@ -1,42 +1,172 @@
+import io
 import os
 import shutil
+import stat
+import struct
+import tempfile
 import logging
-from typing import Dict, Optional, List
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
-from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, List, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 import piexif
 from pathlib import Path
 import re
+import numpy as np
 
 from .config import Config
 from .geo_utils import GeoUtils
 
+logger = logging.getLogger(__name__)
+
+# Формат email для валидации
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Соответствие ключей convert_coordinates тегам GPS IFD
+_GPS_DISPATCH = {
+    'GPSLatitudeRef': piexif.GPSIFD.GPSLatitudeRef,
+    'GPSLatitude': piexif.GPSIFD.GPSLatitude,
+    'GPSLongitudeRef': piexif.GPSIFD.GPSLongitudeRef,
+    'GPSLongitude': piexif.GPSIFD.GPSLongitude,
+}
+# Теги-ссылки (N/S, E/W) записываются как ASCII-байты
+_GPS_ENCODE = frozenset({'GPSLatitudeRef', 'GPSLongitudeRef'})
+
+# Обязательные поля записи таблицы
+_REQUIRED_FIELDS = ('Путь', 'Широта', 'Долгота')
+
+# Поддерживаемые расширения в нижнем регистре для проверки за O(1)
+_EXT_SET = frozenset(ext.lower() for ext in Config.SUPPORTED_FORMATS)
+
+def _parse_coordinate(value) -> float:
+    """Разбор координаты; nan, если значение не число"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+def _iter_photos(root: Union[str, Path]) -> Iterator[Path]:
+    """Рекурсивный обход директории через os.scandir, отдает пути к фотографиям.
+    
+    Символические ссылки не обходятся (они могут образовывать циклы или вести за пределы
+    директории) и пропускаются с предупреждением; недоступные для чтения поддиректории
+    тоже пропускаются, как и при rglob.
+    """
+    try:
+        it = os.scandir(root)
+    except PermissionError:
+        logger.warning("Нет прав доступа к директории: %s", root)
+        return
+    with it:
+        for entry in it:
+            if entry.is_symlink():
+                logger.warning("Пропущена символическая ссылка: %s", entry.path)
+                continue
+            if entry.is_dir():
+                yield from _iter_photos(entry.path)
+            elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in _EXT_SET:
+                yield Path(entry.path)
+
+def _find_exif_segment(data) -> Optional[Tuple[int, int]]:
+    """Поиск сегмента APP1 с EXIF в заголовках JPEG.
+    
+    Возвращает (смещение маркера, длина полезной части сегмента) или None.
+    """
+    if data[0:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker in (0xDA, 0xD9):  # Начало сжатых данных или конец файла
+            return None
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker == 0xE1 and data[pos + 4:pos + 10] == b'Exif\x00\x00':
+            return pos, length - 2
+        pos += 2 + length
+    return None
+
+def _exif_unchanged(data: bytes, exif_bytes: bytes) -> bool:
+    """Совпадает ли сегмент EXIF в data с exif_bytes (с учетом нулевого хвоста)"""
+    segment = _find_exif_segment(data)
+    if segment is None or len(exif_bytes) > segment[1]:
+        return False
+    offset, capacity = segment
+    start = offset + 4
+    end = start + len(exif_bytes)
+    return data[start:end] == exif_bytes and not data[end:start + capacity].strip(b'\x00')
+
+def _patch_exif_in_place(file_path: Path, data: bytes, exif_bytes: bytes, shared: bool = False) -> bool:
+    """Перезапись EXIF внутри существующего сегмента APP1.
+    
+    data - текущее содержимое файла. Срабатывает, только если новые данные помещаются
+    в сегмент: длина сегмента сохраняется, остаток заполняется нулями (читатели EXIF
+    идут по смещениям TIFF и хвост игнорируют). Возвращает False, если нужна полная
+    перезапись файла (в том числе для файлов с несколькими жесткими ссылками, если
+    только shared не указывает, что это ссылки пользователя и менять нужно их все).
+    """
+    segment = _find_exif_segment(data)
+    if segment is None or len(exif_bytes) > segment[1]:
+        return False
+    offset, capacity = segment
+    with open(file_path, 'r+b') as f:
+        if not shared and os.fstat(f.fileno()).st_nlink > 1:
+            # Жесткая ссылка (например, резервная копия) изменилась бы вместе с файлом
+            return False
+        f.seek(offset + 4)
+        f.write(exif_bytes + b'\x00' * (capacity - len(exif_bytes)))
+    return True
+
+def _copy_file_attrs(src: Path, dst: Path):
+    """Перенос прав, владельца и расширенных атрибутов src на новый файл dst.
+    
+    Время изменения у dst остается текущим: содержимое файла действительно изменилось.
+    """
+    src_st = os.stat(src)
+    dst_st = os.stat(dst)
+    # Владельца меняем до прав: chown сбрасывает биты setuid/setgid
+    if (src_st.st_uid, src_st.st_gid) != (dst_st.st_uid, dst_st.st_gid):
+        try:
+            os.chown(dst, src_st.st_uid, src_st.st_gid)
+        except PermissionError:
+            logger.warning("Не удалось сохранить владельца файла: %s", src)
+    # copystat переносит права, флаги и xattr, но заодно и время - его возвращаем
+    shutil.copystat(src, dst)
+    os.utime(dst)
+
+# Обработчик, создаваемый один раз в каждом процессе пула
+_worker_processor = None
+
+def _worker_init(create_backup: bool):
+    """Инициализация процесса пула: логирование и общий обработчик.
+    
+    Настройки передаются из родительского процесса, чтобы при spawn воркеры
+    работали с теми же значениями, что и вызывающий PhotoProcessor.
+    """
+    global _worker_processor
+    # При spawn (Windows, macOS) процесс пула стартует без настроек логирования
+    if not logging.getLogger().handlers:
+        Config.setup_logging()
+    _worker_processor = PhotoProcessor()
+    _worker_processor._create_backup_flag = create_backup
+
+def _process_one(photo_data: Dict) -> Tuple[int, int]:
+    """Обработка одной записи в процессе пула. Возвращает (успешно, ошибок)"""
+    return _worker_processor.process_single_photo(photo_data)
+
 class PhotoProcessor:
     def __init__(self):
         self.config = Config()
-        self.config.ensure_directories()
-        self._setup_logging()
+        # Настройки, которые читаются для каждого файла
+        self._create_backup_flag = Config.CREATE_BACKUP
         self.geo_utils = GeoUtils()
         self.success_count = 0
         self.error_count = 0
         
-    def _setup_logging(self):
-        """Настройка логирования"""
-        self.logger = logging.getLogger(__name__)
-        handler = logging.FileHandler(os.path.join(Config.LOG_DIR, 'photo_processor.log'))
-        handler.setFormatter(logging.Formatter(Config.LOG_FORMAT))
-        self.logger.addHandler(handler)
-        self.logger.setLevel(Config.LOG_LEVEL)
-        
     def validate_data(self, photo_data: Dict) -> bool:
         """Валидация обязательных полей"""
         # Проверка обязательных полей
-        required_fields = ['Путь', 'Широта', 'Долгота']
-        for field in required_fields:
+        for field in _REQUIRED_FIELDS:
             if field not in photo_data or not photo_data[field]:
-                self.logger.error(f"Отсутствует обязательное поле: {field}")
+                logger.error("Отсутствует обязательное поле: %s", field)
                 return False
                 
         # Валидация координат
@@ -44,28 +174,56 @@ class PhotoProcessor:
             lat = float(photo_data['Широта'])
             lon = float(photo_data['Долгота'])
             if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-                self.logger.error(f"Некорректные координаты: {lat}, {lon}")
+                logger.error("Некорректные координаты: %s, %s", lat, lon)
                 return False
         except ValueError:
-            self.logger.error("Некорректный формат координат")
+            logger.error("Некорректный формат координат")
             return False
             
+        # Сохраняем разобранные координаты, чтобы не разбирать их повторно
+        photo_data['_lat'] = lat
+        photo_data['_lon'] = lon
+            
+        self._validate_optional_fields(photo_data)
+        return True
+        
+    def _validate_optional_fields(self, photo_data: Dict):
+        """Проверка необязательных полей (только предупреждения)"""
         # Валидация email если есть
         if 'Email' in photo_data and photo_data['Email']:
-            email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-            if not email_pattern.match(photo_data['Email']):
-                self.logger.warning(f"Некорректный формат email: {photo_data['Email']}")
+            if not _EMAIL_RE.match(photo_data['Email']):
+                logger.warning("Некорректный формат email: %s", photo_data['Email'])
                 
         # Валидация рейтинга если есть
         if 'Рейтинг' in photo_data and photo_data['Рейтинг']:
             try:
                 rating = int(photo_data['Рейтинг'])
                 if not (0 <= rating <= 5):
-                    self.logger.warning(f"Рейтинг вне диапазона 0-5: {rating}")
+                    logger.warning("Рейтинг вне диапазона 0-5: %s", rating)
             except ValueError:
-                self.logger.warning(f"Некорректный формат рейтинга: {photo_data['Рейтинг']}")
+                logger.warning("Некорректный формат рейтинга: %s", photo_data['Рейтинг'])
                 
-        return True
+    def _validate_batch(self, photos_data: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Пакетная проверка обязательных полей и диапазонов координат.
+        
+        Возвращает маску валидных записей и разобранные широты/долготы (nan, если
+        значение не число). Причины отказа логируются через validate_data.
+        """
+        count = len(photos_data)
+        # Пустые обязательные поля (в том числе числовой 0) отклоняются, как в validate_data
+        has_fields = np.fromiter(
+            (all(p.get(field) for field in _REQUIRED_FIELDS) for p in photos_data), dtype=bool, count=count
+        )
+        lats = np.fromiter((_parse_coordinate(p.get('Широта')) for p in photos_data), dtype=np.float64, count=count)
+        lons = np.fromiter((_parse_coordinate(p.get('Долгота')) for p in photos_data), dtype=np.float64, count=count)
+        
+        # Сравнения с nan дают False, поэтому нечисловые значения отсекаются здесь же
+        mask = has_fields & (lats >= -90) & (lats <= 90) & (lons >= -180) & (lons <= 180)
+        
+        for index in np.flatnonzero(~mask):
+            self.validate_data(photos_data[index])
+            
+        return mask, lats, lons
         
     def process_photos(self, photos_data: List[Dict]):
         """Обработка списка фотографий"""
@@ -73,119 +231,171 @@ class PhotoProcessor:
         self.error_count = 0
         
         # Фильтруем данные с валидными полями
-        valid_photos = [photo for photo in photos_data if self.validate_data(photo)]
+        mask, lats, lons = self._validate_batch(photos_data)
+        valid_photos = [photo for photo, valid in zip(photos_data, mask) if valid]
         
         if not valid_photos:
-            self.logger.error("Нет валидных данных для обработки")
+            logger.error("Нет валидных данных для обработки")
             return
             
-        with ThreadPoolExecutor(max_workers=Config.MAX_WORKERS) as executor:
-            list(tqdm(
-                executor.map(self.process_single_photo, valid_photos),
-                total=len(valid_photos),
-                desc="Обработка фотографий"
-            ))
+        lats, lons = lats[mask], lons[mask]
+        for photo, lat, lon in zip(valid_photos, lats.tolist(), lons.tolist()):
+            photo['_lat'] = lat
+            photo['_lon'] = lon
+            self._validate_optional_fields(photo)
             
-        self.logger.info(f"Обработка завершена. Успешно: {self.success_count}, Ошибок: {self.error_count}")
+        self._precompute_gps(valid_photos, lats, lons)
+        
+        # Директории раскрываем в отдельные файлы, чтобы их делил весь пул
+        tasks = self._expand_directories(valid_photos)
+        
+        # Обработка EXIF упирается в CPU и GIL, поэтому используем процессы
+        if tasks:
+            max_workers = Config.MAX_WORKERS
+            chunksize = max(1, len(tasks) // (max_workers * 4))
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_worker_init,
+                initargs=(self._create_backup_flag,)
+            ) as executor:
+                for success, errors in tqdm(
+                    executor.map(_process_one, tasks, chunksize=chunksize),
+                    total=len(tasks),
+                    desc="Обработка фотографий"
+                ):
+                    self.success_count += success
+                    self.error_count += errors
             
-    def process_single_photo(self, photo_data: Dict):
-        """Обработка одной фотографии"""
+        logger.info("Обработка завершена. Успешно: %s, Ошибок: %s", self.success_count, self.error_count)
+            
+    def _expand_directories(self, photos_data: List[Dict]) -> List[Dict]:
+        """Замена записей-директорий на записи для каждого найденного в них файла.
+        
+        Файлы, несуществующие пути и недоступные директории остаются как есть:
+        их проверит и об ошибках сообщит воркер.
+        """
+        tasks = []
+        for photo_data in photos_data:
+            directory = photo_data['Путь']
+            # Один stat на запись; права проверяем только у директорий
+            try:
+                is_dir = stat.S_ISDIR(os.stat(directory).st_mode)
+            except (OSError, ValueError):
+                is_dir = False
+            if not is_dir or not os.access(directory, os.R_OK):
+                tasks.append(photo_data)
+                continue
+                
+            photo_files = self._find_photos(directory)
+            if photo_files is None:
+                self.error_count += 1
+                continue
+            tasks.extend({**photo_data, 'Путь': str(file_path)} for file_path in photo_files)
+        return tasks
+        
+    def _find_photos(self, directory: Union[str, Path]) -> Optional[List[Path]]:
+        """Список фотографий в директории и поддиректориях; None при ошибке обхода"""
+        try:
+            photo_files = list(_iter_photos(directory))
+        except Exception as e:
+            logger.error("Ошибка при обработке директории %s: %s", directory, e)
+            return None
+            
+        if photo_files:
+            logger.info("Найдено %s файлов для обработки в директории %s", len(photo_files), directory)
+        else:
+            logger.warning("В директории %s нет поддерживаемых файлов", directory)
+        return photo_files
+        
+    def _precompute_gps(self, photos_data: List[Dict], lats: np.ndarray, lons: np.ndarray):
+        """Конвертация координат всех записей одним пакетом до отправки в пул"""
+        for photo_data, gps in zip(photos_data, self.geo_utils.convert_coordinates_batch(lats, lons)):
+            photo_data['_gps_data'] = {
+                'GPSLatitudeRef': str(gps['lat_ref']),
+                'GPSLatitude': tuple(map(tuple, gps['lat_dms'].tolist())),
+                'GPSLongitudeRef': str(gps['lon_ref']),
+                'GPSLongitude': tuple(map(tuple, gps['lon_dms'].tolist())),
+            }
+            
+    def process_single_photo(self, photo_data: Dict) -> Tuple[int, int]:
+        """Обработка одной фотографии. Возвращает (успешно, ошибок)"""
         try:
             path = photo_data.get('Путь')
             if not path:
-                self.logger.error("Путь не указан")
-                self.error_count += 1
-                return
+                logger.error("Путь не указан")
+                return 0, 1
                 
             # Преобразуем путь в объект Path для кроссплатформенной совместимости
             # Поддерживаем как абсолютные, так и относительные пути
             path = Path(path)
             
-            # Проверяем существование пути
-            if not path.exists():
-                self.logger.error(f"Путь не существует: {path}")
-                self.error_count += 1
-                return
+            # Проверяем существование пути (один stat на всю диспетчеризацию)
+            try:
+                st = path.stat()
+            except (FileNotFoundError, NotADirectoryError):
+                logger.error("Путь не существует: %s", path)
+                return 0, 1
+            is_dir = stat.S_ISDIR(st.st_mode)
                 
             # Проверяем права доступа
-            try:
-                if path.is_file():
-                    with open(path, 'rb') as f:
-                        pass
-                elif path.is_dir():
-                    # Проверяем доступ к директории
-                    list(path.iterdir())
-            except PermissionError:
-                self.logger.error(f"Нет прав доступа к пути: {path}")
-                self.error_count += 1
-                return
+            if not os.access(path, os.R_OK):
+                logger.error("Нет прав доступа к пути: %s", path)
+                return 0, 1
                 
             # Обрабатываем директорию или файл
-            if path.is_dir():
-                self._process_directory(path, photo_data)
-            else:
-                if path.suffix.lower() in ['.jpg', '.jpeg']:
-                    self._process_file(path, photo_data)
-                else:
-                    self.logger.error(f"Неподдерживаемый формат файла: {path}")
-                    self.error_count += 1
+            if is_dir:
+                return self._process_directory(path, photo_data)
+            if path.suffix.lower() in _EXT_SET:
+                return self._process_file(path, photo_data)
+            logger.error("Неподдерживаемый формат файла: %s", path)
+            return 0, 1
                 
         except Exception as e:
-            self.logger.error(f"Ошибка при обработке {photo_data.get('Путь')}: {str(e)}")
-            self.error_count += 1
+            logger.error("Ошибка при обработке %s: %s", photo_data.get('Путь'), e)
+            return 0, 1
             
-    def _process_directory(self, directory: Path, photo_data: Dict):
-        """Обработка директории с фотографиями"""
-        try:
-            # Получаем список всех файлов в директории и поддиректориях
-            files = list(directory.rglob("*"))
-            photo_files = [f for f in files if f.suffix.lower() in ['.jpg', '.jpeg']]
-            
-            if not photo_files:
-                self.logger.warning(f"В директории {directory} нет поддерживаемых файлов")
-                return
-                
-            self.logger.info(f"Найдено {len(photo_files)} файлов для обработки в директории {directory}")
+    def _process_directory(self, directory: Path, photo_data: Dict) -> Tuple[int, int]:
+        """Обработка директории в текущем процессе. Возвращает (успешно, ошибок)
+        
+        process_photos раскрывает директории заранее; сюда попадают только вызовы
+        process_single_photo напрямую.
+        """
+        photo_files = self._find_photos(directory)
+        if photo_files is None:
+            return 0, 1
             
-            # Используем tqdm для отображения прогресса
-            for file_path in tqdm(photo_files, desc=f"Обработка файлов в {directory.name}"):
-                try:
-                    self.logger.info(f"Обработка файла из директории: {file_path}")
-                    self._process_file(file_path, photo_data)
-                except Exception as e:
-                    self.logger.error(f"Ошибка при обработке файла {file_path}: {str(e)}")
-                    self.error_count += 1
-                
-        except Exception as e:
-            self.logger.error(f"Ошибка при обработке директории {directory}: {str(e)}")
-            self.error_count += 1
+        success_count = error_count = 0
+        for file_path in photo_files:
+            success, errors = self._process_file(file_path, photo_data)
+            success_count += success
+            error_count += errors
+        return success_count, error_count
                     
-    def _process_file(self, file_path: Path, photo_data: Dict):
-        """Обработка отдельного файла"""
+    def _process_file(self, file_path: Path, photo_data: Dict) -> Tuple[int, int]:
+        """Обработка отдельного файла. Возвращает (успешно, ошибок)"""
         try:
-            # Создаем резервную копию если нужно
-            if Config.CREATE_BACKUP:
-                self._create_backup(file_path)
+            # Координаты разобраны и проверены при валидации
+            if '_lat' not in photo_data and not self.validate_data(photo_data):
+                logger.error("Некорректные данные для файла %s", file_path)
+                return 0, 1
+            lat = photo_data['_lat']
+            lon = photo_data['_lon']
                 
-            # Проверяем наличие координат
-            try:
-                lat = float(photo_data['Широта'])
-                lon = float(photo_data['Долгота'])
+            # Пишем в сам файл, а не в символическую ссылку на него
+            file_path = Path(os.path.realpath(file_path))
                 
-                if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-                    self.logger.error(f"Некорректные координаты для файла {file_path}: {lat}, {lon}")
-                    self.error_count += 1
-                    return
-            except ValueError:
-                self.logger.error(f"Некорректный формат координат для файла {file_path}")
-                self.error_count += 1
-                return
+            # Файл читается один раз: из этих байтов разбирается и собирается EXIF
+            with open(file_path, 'rb') as f:
+                data = f.read()
+                # У файла есть жесткие ссылки пользователя: правим его на месте,
+                # чтобы новые данные были видны по всем ссылкам
+                shared = os.fstat(f.fileno()).st_nlink > 1
                 
             try:
                 # Получаем EXIF данные
-                exif_dict = piexif.load(str(file_path))
+                exif_dict = piexif.load(data)
             except Exception as e:
-                self.logger.error(f"Ошибка при чтении EXIF данных файла {file_path}: {str(e)}")
+                logger.error("Ошибка при чтении EXIF данных файла %s: %s", file_path, e)
                 # Создаем пустой EXIF словарь
                 exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
                 
@@ -193,43 +403,109 @@ class PhotoProcessor:
             if 'GPS' not in exif_dict:
                 exif_dict['GPS'] = {}
                 
-            # Конвертируем координаты в формат EXIF
-            gps_data, _ = self.geo_utils.convert_coordinates(lat, lon)
+            # Координаты в формате EXIF обычно уже посчитаны в process_photos
+            gps_data = photo_data.get('_gps_data')
+            if gps_data is None:
+                gps_data, _ = self.geo_utils.convert_coordinates(lat, lon)
             
             # Добавляем GPS данные в EXIF
+            gps_ifd = exif_dict['GPS']
             for key, value in gps_data.items():
-                if key == 'GPSLatitudeRef':
-                    exif_dict['GPS'][piexif.GPSIFD.GPSLatitudeRef] = value.encode('utf-8')
-                elif key == 'GPSLatitude':
-                    exif_dict['GPS'][piexif.GPSIFD.GPSLatitude] = value
-                elif key == 'GPSLongitudeRef':
-                    exif_dict['GPS'][piexif.GPSIFD.GPSLongitudeRef] = value.encode('utf-8')
-                elif key == 'GPSLongitude':
-                    exif_dict['GPS'][piexif.GPSIFD.GPSLongitude] = value
+                gps_ifd[_GPS_DISPATCH[key]] = value.encode('utf-8') if key in _GPS_ENCODE else value
                     
             # Добавляем дополнительные метаданные
             self._add_metadata(exif_dict, photo_data)
             
+            exif_bytes = piexif.dump(exif_dict)
+            
+            # Повторный запуск с теми же данными: файл не трогаем
+            if _exif_unchanged(data, exif_bytes):
+                logger.info("EXIF файла уже актуален: %s", file_path)
+                return 1, 0
+                
+            # Резервная копия нужна только для отладки: запись EXIF атомарна
+            if self._create_backup_flag:
+                self._create_backup(file_path, data, shared)
+                
             try:
                 # Сохраняем изменения
-                exif_bytes = piexif.dump(exif_dict)
-                piexif.insert(exif_bytes, str(file_path))
+                self._write_exif(file_path, data, exif_bytes, shared)
                 
-                self.logger.info(f"Успешно обработан файл: {file_path}")
-                self.success_count += 1
+                logger.info("Успешно обработан файл: %s", file_path)
+                return 1, 0
             except Exception as e:
-                self.logger.error(f"Ошибка при сохранении EXIF данных в файл {file_path}: {str(e)}")
-                self.error_count += 1
+                logger.error("Ошибка при сохранении EXIF данных в файл %s: %s", file_path, e)
+                return 0, 1
             
         except Exception as e:
-            self.logger.error(f"Ошибка при обработке файла {file_path}: {str(e)}")
-            self.error_count += 1
+            logger.error("Ошибка при обработке файла %s: %s", file_path, e)
+            return 0, 1
+            
+    def _write_exif(self, file_path: Path, data: bytes, exif_bytes: bytes, shared: bool = False):
+        """Запись EXIF в файл с исходным содержимым data.
+        
+        Если новый EXIF помещается в существующий сегмент APP1, меняются только
+        его байты. Иначе файл атомарно перезаписывается: во временный файл, затем os.replace.
+        Файл с жесткими ссылками пользователя (shared) перезаписывается на месте.
+        """
+        if _patch_exif_in_place(file_path, data, exif_bytes, shared):
+            return
             
-    def _create_backup(self, file_path: Path):
-        """Создание резервной копии файла"""
+        output = io.BytesIO()
+        piexif.insert(exif_bytes, data, output)
+        
+        if shared:
+            # os.replace отвязал бы файл от остальных ссылок; пишем в тот же inode.
+            # Такая запись не атомарна, поэтому на ее время держим полную копию файла
+            backup_path = self._create_backup(file_path, data, shared=True)
+            with open(file_path, 'r+b') as f:
+                f.write(output.getbuffer())
+                f.truncate()
+            if backup_path is not None and not self._create_backup_flag:
+                backup_path.unlink()
+            return
+        
+        # Уникальное имя: один файл может попасть в пул дважды (строкой-файлом и через директорию)
+        fd, tmp_name = tempfile.mkstemp(prefix=file_path.name + '.', suffix='.tmp', dir=file_path.parent)
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(output.getbuffer())
+            _copy_file_attrs(file_path, tmp_path)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            # Проверяем наличие временного файла только на пути ошибки,
+            # в том числе при прерывании (KeyboardInterrupt, SystemExit)
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+                
+    def _create_backup(self, file_path: Path, data: bytes, shared: bool = False) -> Optional[Path]:
+        """Создание резервной копии файла с исходным содержимым data.
+        
+        shared - у файла есть жесткие ссылки пользователя, и он будет изменен на месте.
+        Возвращает путь к созданной копии или None, если копия уже существовала.
+        """
         backup_path = file_path.with_suffix(file_path.suffix + '.backup')
-        if not backup_path.exists():
-            shutil.copy2(file_path, backup_path)
+        if not shared:
+            # Файл с несколькими жесткими ссылками не правится на месте, а заменяется
+            # через os.replace, поэтому ссылка сохраняет исходное содержимое без копирования.
+            # Существующую копию os.link не перезапишет, отдельный stat не нужен.
+            try:
+                os.link(file_path, backup_path)
+                return backup_path
+            except FileExistsError:
+                return None
+            except OSError:
+                pass
+        # Содержимое уже прочитано в память: пишем его, не читая файл повторно
+        try:
+            with open(backup_path, 'xb') as f:
+                f.write(data)
+        except FileExistsError:
+            return None
+        shutil.copystat(file_path, backup_path)
+        return backup_path
             
     def _add_metadata(self, exif_dict: Dict, photo_data: Dict):
         """Добавление дополнительных метаданных"""
@@ -247,9 +523,9 @@ class PhotoProcessor:
                     if 0 <= rating <= 5:
                         exif_dict['Exif'][piexif.ExifIFD.Rating] = rating
                     else:
-                        self.logger.warning(f"Рейтинг вне диапазона 0-5: {rating}")
+                        logger.warning("Рейтинг вне диапазона 0-5: %s", rating)
                 except ValueError:
-                    self.logger.warning(f"Некорректный формат рейтинга: {photo_data['Рейтинг']}")
+                    logger.warning("Некорректный формат рейтинга: %s", photo_data['Рейтинг'])
                 
             # Категории и теги
             tags = []
@@ -264,14 +540,14 @@ class PhotoProcessor:
                 try:
                     exif_dict['0th'][piexif.ImageIFD.XPKeywords] = '; '.join(tags).encode('utf-8')
                 except Exception as e:
-                    self.logger.warning(f"Ошибка при добавлении тегов: {str(e)}")
+                    logger.warning("Ошибка при добавлении тегов: %s", e)
                 
             # Описание
             if 'Описание' in photo_data and photo_data['Описание']:
                 try:
                     exif_dict['0th'][piexif.ImageIFD.ImageDescription] = photo_data['Описание'].encode('utf-8')
                 except Exception as e:
-                    self.logger.warning(f"Ошибка при добавлении описания: {str(e)}")
+                    logger.warning("Ошибка при добавлении описания: %s", e)
                 
             # Контактная информация
             contact_info = []
@@ -286,7 +562,7 @@ class PhotoProcessor:
                 try:
                     exif_dict['0th'][piexif.ImageIFD.Artist] = '\n'.join(contact_info).encode('utf-8')
                 except Exception as e:
-                    self.logger.warning(f"Ошибка при добавлении контактной информации: {str(e)}")
+                    logger.warning("Ошибка при добавлении контактной информации: %s", e)
                 
             # Географическая информация
             location_info = []
@@ -303,7 +579,7 @@ class PhotoProcessor:
                 try:
                     exif_dict['0th'][piexif.ImageIFD.DocumentName] = ', '.join(location_info).encode('utf-8')
                 except Exception as e:
-                    self.logger.warning(f"Ошибка при добавлении географической информации: {str(e)}")
+                    logger.warning("Ошибка при добавлении географической информации: %s", e)
                 
             # Подписи
             captions = []
@@ -316,7 +592,7 @@ class PhotoProcessor:
                 try:
                     exif_dict['0th'][piexif.ImageIFD.XPTitle] = '\n'.join(captions).encode('utf-8')
                 except Exception as e:
-                    self.logger.warning(f"Ошибка при добавлении подписей: {str(e)}")
+                    logger.warning("Ошибка при добавлении подписей: %s", e)
                 
         except Exception as e:
-            self.logger.error(f"Ошибка при добавлении метаданных: {str(e)}") 
\ No newline at end of file
+            logger.error("Ошибка при добавлении метаданных: %s", e) 
\ No newline at end of file
@@ -0,0 +1,121 @@
+import atexit
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.config import Config
+from src.geo_utils import GeoUtils
+
+
+class GeoUtilsTestCase(unittest.TestCase):
+    """Кэш и логи во временной директории, а не в рабочей копии"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = tmp.name
+        for name in ('CACHE_DIR', 'LOG_DIR'):
+            patcher = mock.patch.object(Config, name, tmp.name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.geo = self._geo_utils()
+
+    def _geo_utils(self) -> GeoUtils:
+        geo = GeoUtils()
+        atexit.unregister(geo._close_cache)
+        self.addCleanup(geo._close_cache)
+        return geo
+
+
+class GeoCacheTest(GeoUtilsTestCase):
+    """Кэш геоданных в SQLite"""
+
+    def _location(self, address: str):
+        return mock.Mock(address=address, raw={'address': {'city': address}})
+
+    def test_two_instances_share_cache(self):
+        other = self._geo_utils()
+        with mock.patch.object(self.geo, '_reverse', return_value=self._location('A')), \
+                mock.patch.object(other, '_reverse', return_value=self._location('B')) as reverse:
+            self.assertEqual(self.geo.get_location_info(55.75, 37.61)['address'], 'A')
+            # Запись второго подключения не должна ждать блокировку первого
+            started = time.monotonic()
+            self.assertEqual(other.get_location_info(59.93, 30.31)['address'], 'B')
+            self.assertLess(time.monotonic() - started, 1)
+            # Запись первого экземпляра видна второму без повторного запроса
+            self.assertEqual(other.get_location_info(55.75, 37.61)['address'], 'A')
+        self.assertEqual(reverse.call_count, 1)
+
+    def test_cache_error_keeps_result(self):
+        with mock.patch.object(self.geo, '_reverse', return_value=self._location('A')):
+            # Запрос к закрытому подключению падает с sqlite3.Error, как и при блокировке базы
+            self.geo.cache.close()
+            self.assertEqual(self.geo.get_location_info(55.75, 37.61)['address'], 'A')
+
+    def test_quantized_key_hits_cache(self):
+        with mock.patch.object(self.geo, '_reverse', return_value=self._location('A')) as reverse:
+            self.geo.get_location_info(55.7558, 37.6173)
+            self.geo.get_location_info(55.75580000000001, 37.6173)
+        self.assertEqual(reverse.call_count, 1)
+
+    def test_legacy_json_imported_once(self):
+        legacy = {
+            '55.7558,37.6173': {'address': 'Москва', 'raw': {}},
+            '59.93000000000001,30.31': {'address': 'Санкт-Петербург', 'raw': {}},
+            'broken': {'address': 'нет'},
+        }
+        with open(os.path.join(self.cache_dir, 'geo_cache.json'), 'w', encoding='utf-8') as f:
+            json.dump(legacy, f, ensure_ascii=False)
+
+        geo = self._geo_utils()
+        with mock.patch.object(geo, '_reverse') as reverse:
+            self.assertEqual(geo.get_location_info(55.7558, 37.6173)['address'], 'Москва')
+            self.assertEqual(geo.get_location_info(59.93, 30.31)['address'], 'Санкт-Петербург')
+        reverse.assert_not_called()
+
+        # Таблица уже заполнена: повторного импорта нет
+        with mock.patch('src.geo_utils.orjson.loads', side_effect=AssertionError) as loads:
+            self._geo_utils()
+        loads.assert_not_called()
+
+
+class ConvertCoordinatesBatchTest(GeoUtilsTestCase):
+    """convert_coordinates_batch должен совпадать с convert_coordinates"""
+
+    def _assert_matches(self, lats, lons):
+        batch = self.geo.convert_coordinates_batch(np.asarray(lats), np.asarray(lons))
+        self.assertEqual(batch.dtype, GeoUtils.GPS_BATCH_DTYPE)
+        self.assertEqual(len(batch), len(lats))
+        for lat, lon, gps in zip(lats, lons, batch):
+            expected, _ = self.geo.convert_coordinates(lat, lon)
+            actual = {
+                'GPSLatitudeRef': str(gps['lat_ref']),
+                'GPSLatitude': tuple(map(tuple, gps['lat_dms'].tolist())),
+                'GPSLongitudeRef': str(gps['lon_ref']),
+                'GPSLongitude': tuple(map(tuple, gps['lon_dms'].tolist())),
+            }
+            self.assertEqual(actual, expected, (lat, lon))
+
+    def test_random_points(self):
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(-90, 90, 20000).tolist()
+        lons = rng.uniform(-180, 180, 20000).tolist()
+        self._assert_matches(lats, lons)
+
+    def test_edge_points(self):
+        lats = [0.0, -0.0, 90.0, -90.0, 55.7558, -33.8688, 1e-9, 59.999999999]
+        lons = [0.0, -0.0, 180.0, -180.0, 37.6173, 151.2093, -1e-9, -0.5]
+        self._assert_matches(lats, lons)
+
+    def test_empty_batch(self):
+        batch = self.geo.convert_coordinates_batch(np.empty(0), np.empty(0))
+        self.assertEqual(len(batch), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
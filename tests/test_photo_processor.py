@@ -0,0 +1,283 @@
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import piexif
+from PIL import Image
+
+from src.photo_processor import (
+    PhotoProcessor,
+    _exif_unchanged,
+    _find_exif_segment,
+    _patch_exif_in_place,
+)
+
+GPS_DATA = {
+    'GPSLatitudeRef': 'N',
+    'GPSLatitude': ((55, 1), (45, 1), (2088, 100)),
+    'GPSLongitudeRef': 'E',
+    'GPSLongitude': ((37, 1), (37, 1), (1800, 100)),
+}
+
+
+def _exif(description: bytes = b'', gps: bool = False) -> bytes:
+    """EXIF с описанием заданной длины и, при необходимости, GPS"""
+    exif_dict = {'0th': {}, 'Exif': {}, 'GPS': {}, '1st': {}, 'thumbnail': None}
+    if description:
+        exif_dict['0th'][piexif.ImageIFD.ImageDescription] = description
+    if gps:
+        exif_dict['GPS'] = {
+            piexif.GPSIFD.GPSLatitudeRef: b'N',
+            piexif.GPSIFD.GPSLatitude: GPS_DATA['GPSLatitude'],
+            piexif.GPSIFD.GPSLongitudeRef: b'E',
+            piexif.GPSIFD.GPSLongitude: GPS_DATA['GPSLongitude'],
+        }
+    return piexif.dump(exif_dict)
+
+
+def _make_jpeg(path: Path, exif: bytes = None) -> Path:
+    """Маленький JPEG, при необходимости с сегментом EXIF"""
+    kwargs = {'exif': exif} if exif is not None else {}
+    Image.new('RGB', (16, 16), 'red').save(path, 'JPEG', **kwargs)
+    return path
+
+
+class _InterruptedBuffer(io.BytesIO):
+    """Буфер, чтение которого прерывается, как при Ctrl+C"""
+
+    def getbuffer(self):
+        raise KeyboardInterrupt
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Тесты с файлами во временной директории"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def _jpeg(self, name: str = 'photo.jpg', exif: bytes = None) -> Path:
+        return _make_jpeg(self.dir / name, exif)
+
+
+class ExifSegmentTest(TempDirTestCase):
+    """Поиск и перезапись сегмента APP1 на месте"""
+
+    def test_patch_fits_in_place(self):
+        path = self._jpeg(exif=_exif(b'x' * 300))
+        data = path.read_bytes()
+        offset, capacity = _find_exif_segment(data)
+        new_exif = _exif(b'short', gps=True)
+        self.assertLess(len(new_exif), capacity)
+
+        self.assertTrue(_patch_exif_in_place(path, data, new_exif))
+
+        patched = path.read_bytes()
+        self.assertEqual(len(patched), len(data))
+        # Изменился только сегмент EXIF, хвост сегмента заполнен нулями
+        start = offset + 4
+        self.assertEqual(patched[:start], data[:start])
+        self.assertEqual(patched[start + capacity:], data[start + capacity:])
+        self.assertEqual(patched[start:start + len(new_exif)], new_exif)
+        self.assertFalse(patched[start + len(new_exif):start + capacity].strip(b'\x00'))
+        self.assertTrue(_exif_unchanged(patched, new_exif))
+
+    def test_padded_segment_reloads(self):
+        path = self._jpeg(exif=_exif(b'x' * 300))
+        data = path.read_bytes()
+        self.assertTrue(_patch_exif_in_place(path, data, _exif(b'short', gps=True)))
+
+        exif_dict = piexif.load(str(path))
+        self.assertEqual(exif_dict['0th'][piexif.ImageIFD.ImageDescription], b'short')
+        self.assertEqual(exif_dict['GPS'][piexif.GPSIFD.GPSLatitude], GPS_DATA['GPSLatitude'])
+
+        with Image.open(path) as img:
+            img.load()
+            exif = img.getexif()
+            self.assertEqual(exif[piexif.ImageIFD.ImageDescription], 'short')
+            gps = exif.get_ifd(0x8825)
+            self.assertEqual(gps[piexif.GPSIFD.GPSLatitudeRef], 'N')
+            self.assertEqual(img.size, (16, 16))
+
+    def test_patch_does_not_fit(self):
+        path = self._jpeg(exif=_exif(b'x'))
+        data = path.read_bytes()
+        new_exif = _exif(b'y' * 500, gps=True)
+
+        self.assertFalse(_patch_exif_in_place(path, data, new_exif))
+        self.assertEqual(path.read_bytes(), data)
+        self.assertFalse(_exif_unchanged(data, new_exif))
+
+    def test_no_exif_segment(self):
+        path = self._jpeg()
+        data = path.read_bytes()
+        self.assertIsNone(_find_exif_segment(data))
+        self.assertFalse(_exif_unchanged(data, _exif(b'x')))
+        self.assertFalse(_patch_exif_in_place(path, data, _exif(b'x')))
+        self.assertEqual(path.read_bytes(), data)
+
+    def test_non_exif_app1_is_ignored(self):
+        path = self._jpeg()
+        data = path.read_bytes()
+        # APP1 с XMP сразу после SOI не должен приниматься за EXIF
+        payload = b'http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta/>'
+        xmp = b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload
+        self.assertIsNone(_find_exif_segment(data[:2] + xmp + data[2:]))
+
+    def test_not_a_jpeg(self):
+        self.assertIsNone(_find_exif_segment(b'\x89PNG\r\n\x1a\n'))
+
+    def test_hard_link_refused(self):
+        path = self._jpeg(exif=_exif(b'x' * 300))
+        os.link(path, self.dir / 'link.jpg')
+        data = path.read_bytes()
+
+        self.assertFalse(_patch_exif_in_place(path, data, _exif(b'short')))
+        self.assertEqual(path.read_bytes(), data)
+        # Ссылки пользователя правятся на месте: изменение видно по обеим
+        self.assertTrue(_patch_exif_in_place(path, data, _exif(b'short'), shared=True))
+        self.assertEqual((self.dir / 'link.jpg').read_bytes(), path.read_bytes())
+
+
+class WriteExifTest(TempDirTestCase):
+    """Запись EXIF через PhotoProcessor"""
+
+    def setUp(self):
+        super().setUp()
+        with mock.patch('src.photo_processor.GeoUtils'):
+            self.processor = PhotoProcessor()
+        self.processor._create_backup_flag = False
+
+    def _photo_data(self, path: Path) -> dict:
+        return {
+            'Путь': str(path),
+            'Описание': 'Описание',
+            '_lat': 55.75,
+            '_lon': 37.61,
+            '_gps_data': GPS_DATA,
+        }
+
+    def test_full_rewrite_when_exif_does_not_fit(self):
+        path = self._jpeg(exif=_exif(b'x'))
+        data = path.read_bytes()
+        new_exif = _exif(b'y' * 500, gps=True)
+
+        self.processor._write_exif(path, data, new_exif)
+
+        self.assertEqual(piexif.load(str(path))['0th'][piexif.ImageIFD.ImageDescription], b'y' * 500)
+        with Image.open(path) as img:
+            img.load()
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()), ['photo.jpg'])
+
+    def test_full_rewrite_without_exif(self):
+        path = self._jpeg()
+        data = path.read_bytes()
+
+        self.processor._write_exif(path, data, _exif(gps=True))
+
+        self.assertEqual(piexif.load(str(path))['GPS'][piexif.GPSIFD.GPSLongitudeRef], b'E')
+
+    def test_symlink_is_written_through(self):
+        path = self._jpeg()
+        link = self.dir / 'link.jpg'
+        os.symlink(path, link)
+
+        self.assertEqual(self.processor._process_file(link, self._photo_data(link)), (1, 0))
+
+        self.assertTrue(link.is_symlink())
+        self.assertTrue(piexif.load(str(path))['GPS'])
+
+    def test_hard_links_keep_sharing_data(self):
+        path = self._jpeg()
+        link = self.dir / 'link.jpg'
+        os.link(path, link)
+
+        self.assertEqual(self.processor._process_file(path, self._photo_data(path)), (1, 0))
+
+        self.assertTrue(os.path.samefile(path, link))
+        self.assertTrue(piexif.load(str(link))['GPS'])
+        # Временная копия на время записи на месте удаляется после успеха
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()), ['link.jpg', 'photo.jpg'])
+
+    def test_interrupted_shared_rewrite_keeps_backup(self):
+        path = self._jpeg()
+        os.link(path, self.dir / 'link.jpg')
+        data = path.read_bytes()
+
+        # Прерывание, когда файл уже открыт для записи на месте
+        with mock.patch.object(io, 'BytesIO', _InterruptedBuffer):
+            with self.assertRaises(KeyboardInterrupt):
+                self.processor._write_exif(path, data, _exif(gps=True), shared=True)
+
+        self.assertEqual((self.dir / 'photo.jpg.backup').read_bytes(), data)
+
+    def test_unchanged_exif_is_not_rewritten(self):
+        path = self._jpeg()
+        photo_data = self._photo_data(path)
+        self.assertEqual(self.processor._process_file(path, photo_data), (1, 0))
+        mtime = os.stat(path).st_mtime_ns
+
+        with mock.patch.object(self.processor, '_write_exif') as write_exif:
+            self.assertEqual(self.processor._process_file(path, photo_data), (1, 0))
+        write_exif.assert_not_called()
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+
+class ValidateBatchTest(unittest.TestCase):
+    """Маска _validate_batch должна совпадать с validate_data по каждой записи"""
+
+    CASES = [
+        # (Путь, Широта, Долгота)
+        ('photo.jpg', '55.7558', '37.6173'),
+        ('photo.jpg', '-90', '-180'),
+        ('photo.jpg', '90', '180'),
+        ('photo.jpg', ' 55.7 ', '1e1'),
+        ('photo.jpg', '0', '0'),
+        ('photo.jpg', 0, 0),
+        ('photo.jpg', 0.0, '37.6'),
+        ('photo.jpg', 55.7558, 37.6173),
+        ('', '55.7', '37.6'),
+        (None, '55.7', '37.6'),
+        ('photo.jpg', '', '37.6'),
+        ('photo.jpg', '55.7', None),
+        ('photo.jpg', 'abc', '37.6'),
+        ('photo.jpg', '55,7', '37.6'),
+        ('photo.jpg', 'nan', '37.6'),
+        ('photo.jpg', float('nan'), '37.6'),
+        ('photo.jpg', 'inf', '37.6'),
+        ('photo.jpg', '55.7', '-inf'),
+        ('photo.jpg', '90.0001', '37.6'),
+        ('photo.jpg', '55.7', '-180.5'),
+    ]
+
+    def setUp(self):
+        with mock.patch('src.photo_processor.GeoUtils'):
+            self.processor = PhotoProcessor()
+
+    def _rows(self):
+        rows = [{'Путь': path, 'Широта': lat, 'Долгота': lon} for path, lat, lon in self.CASES]
+        # Записи без полей вовсе
+        rows += [{'Широта': '55.7', 'Долгота': '37.6'}, {'Путь': 'photo.jpg', 'Долгота': '37.6'}, {}]
+        return rows
+
+    def test_mask_matches_validate_data(self):
+        with self.assertLogs('src.photo_processor', 'ERROR'):
+            mask = self.processor._validate_batch(self._rows())[0]
+            expected = [self.processor.validate_data(row) for row in self._rows()]
+        for row, actual, valid in zip(self._rows(), mask.tolist(), expected):
+            with self.subTest(row=row):
+                self.assertEqual(actual, valid)
+
+    def test_parsed_coordinates(self):
+        _, lats, lons = self.processor._validate_batch([{'Путь': 'a.jpg', 'Широта': '55.5', 'Долгота': 'abc'}])
+        self.assertEqual(lats.tolist(), [55.5])
+        self.assertTrue(np.isnan(lons[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()